@@ -1,23 +1,39 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import joblib
-import base64
+import hashlib
+import io
+import os
+import tempfile
+import pybase64
 import random
-import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from types import MappingProxyType
 import numpy as np
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.svm import LinearSVC
 
 import re
 import string
 
+st.set_page_config(layout="centered")
+
 # ================================
 # 🧹 TEXT CLEANING FUNCTION
 # ================================
+URL_RE = re.compile(r"http\S+")
+NON_ALPHA_RE = re.compile(r"[^a-zA-Z\s]")
+WHITESPACE_RE = re.compile(r"\s+")
+
 def clean_text(text):
     """Preprocess and clean feedback text before prediction."""
     text = text.lower()
-    text = re.sub(r"http\S+", "", text)  # remove URLs
-    text = re.sub(r"[^a-zA-Z\s]", "", text)  # remove punctuation & numbers
-    text = re.sub(r"\s+", " ", text).strip()  # remove extra spaces
+    text = URL_RE.sub("", text)  # remove URLs
+    text = NON_ALPHA_RE.sub("", text)  # remove punctuation & numbers
+    text = WHITESPACE_RE.sub(" ", text).strip()  # remove extra spaces
     return text
 
 # ================================
@@ -25,24 +41,144 @@ def clean_text(text):
 # ================================
 MODEL_PATH = "restaurant_feedback_model.pkl"
 VECTORIZER_PATH = "tfidf_vectorizer.pkl"
+STATIC_BG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "bg")
+STATIC_BG_URL = "app/static/bg"
+STATIC_BG_MAX_FILES = 100
+ENCODED_BG_MAX_ENTRIES = 32
+BG_MAX_SIZE = (1920, 1080)
+BG_WEBP_QUALITY = 80
+UPLOAD_CHUNK_SIZE = 1 << 20
+OOV_WARNING = "⚠️ None of these words are known to the model, so this is only its default guess."
+
+# Sentiment labels indexed by predicted class, keyed by the model's class count
+LABELS_BY_CLASS_COUNT = MappingProxyType({
+    2: ("negative", "positive"),
+    3: ("negative", "neutral", "positive"),
+})
+
+COLOR_MAP = MappingProxyType({
+    "positive": "#00C851",
+    "negative": "#ff4444",
+    "neutral": "#33b5e5"
+})
+
+WITTY_LINES = MappingProxyType({
+    "positive": (
+        "Keep delighting your customers! 🌟",
+        "Your customers are loving it — keep the momentum! 💖",
+        "Fantastic feedback — your efforts are paying off! 🎉"
+    ),
+    "negative": (
+        "Time to spice things up a bit! 🌶️",
+        "Some customers are unhappy — let’s fix that 💪",
+        "Don't worry, feedback is the first step to improvement! 🚀"
+    ),
+    "neutral": (
+        "Mixed feelings — maybe consistency is key 🔄",
+        "Neither hot nor cold — you can warm things up! ☕",
+        "Good, but there’s room to impress even more ✨"
+    )
+})
+DEFAULT_WITTY_LINES = ("Keep striving to make every customer smile! 😄",)
+
+# Result card accents, matched to the st-key-result_<label> container class
+RESULT_CARD_CSS = "<style>" + "".join(
+    f""".st-key-result_{label} {{
+        background-color: {color};
+        box-shadow: 0 0 20px {color};
+        border-radius: 15px;
+        text-align: center;
+        color: white;
+    }}
+    .st-key-result_{label} [data-testid="stMetricValue"] {{ color: white; justify-content: center; }}"""
+    for label, color in {**COLOR_MAP, "unknown": "#444"}.items()
+) + "</style>"
 
 # ================================
 # ⚙️ UTILITIES
 # ================================
-def get_base64_image_url(uploaded_file):
-    """Converts uploaded file to Base64 URL."""
+def file_digest(uploaded_file):
+    """Hashes the uploaded file in chunks, without copying it into one bytes object."""
+    digest = hashlib.blake2b(digest_size=8)
+    uploaded_file.seek(0)
+    for chunk in iter(lambda: uploaded_file.read(UPLOAD_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+def shrink_image(image_file) -> bytes:
+    """Downscales an image to the background size cap and re-encodes it as WebP."""
+    img = ImageOps.exif_transpose(Image.open(image_file))
+    img.thumbnail(BG_MAX_SIZE, Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    # WebP keeps alpha, so only flatten images without transparency
+    mode = "RGBA" if img.has_transparency_data else "RGB"
+    img.convert(mode).save(buf, "WEBP", quality=BG_WEBP_QUALITY, method=4)
+    return buf.getvalue()
+
+@st.cache_data(show_spinner=False, max_entries=ENCODED_BG_MAX_ENTRIES)
+def encode_image(digest, _image_file) -> str:
+    """Encodes an image as a Base64 data URL, cached on its content digest."""
+    base64_encoded_data = pybase64.b64encode_as_string(shrink_image(_image_file))
+    return f"data:image/webp;base64,{base64_encoded_data}"
+
+def prune_static_images():
+    """Deletes the least recently used backgrounds beyond STATIC_BG_MAX_FILES."""
+    # Uploads are saved from a thread pool, so files may vanish under a concurrent prune
+    entries = []
+    for entry in os.scandir(STATIC_BG_DIR):
+        if entry.name.endswith(".webp"):
+            try:
+                entries.append((entry.stat().st_mtime, entry.path))
+            except FileNotFoundError:
+                pass
+    entries.sort(reverse=True)
+    for _, path in entries[STATIC_BG_MAX_FILES:]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def save_static_image(digest, image_file):
+    """Writes a shrunk copy of the image once under static/bg and returns its URL."""
+    filename = f"{digest}.webp"
+    path = os.path.join(STATIC_BG_DIR, filename)
+    if os.path.exists(path):
+        # Content-addressed, so an existing file is already this image; mark it as recently used
+        os.utime(path)
+    else:
+        # Encode before touching disk, then swap in atomically so a failed or
+        # concurrent write never leaves a partial file at the served path
+        data = shrink_image(image_file)
+        os.makedirs(STATIC_BG_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=STATIC_BG_DIR, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        prune_static_images()
+    return f"{STATIC_BG_URL}/{filename}"
+
+def get_image_url(uploaded_file):
+    """Serves uploaded file as a static file, falling back to a Base64 URL."""
     try:
-        bytes_data = uploaded_file.getvalue()
-        base64_encoded_data = base64.b64encode(bytes_data).decode("utf-8")
-        mime_type = uploaded_file.type or "image/png"
-        return f"data:{mime_type};base64,{base64_encoded_data}"
+        digest = file_digest(uploaded_file)
+        if st.get_option("server.enableStaticServing"):
+            return save_static_image(digest, uploaded_file)
+        return encode_image(digest, uploaded_file)
+    except (UnidentifiedImageError, OSError):
+        st.error(f"Error processing image: {uploaded_file.name} is not a readable image.")
+        return None
     except Exception as e:
         st.error(f"Error processing image: {e}")
         return None
 
-def set_cinematic_bg(base64_urls, interval_per_image=6):
+def set_cinematic_bg(image_urls, interval_per_image=6):
     """Applies cinematic slideshow background."""
-    num_images = len(base64_urls)
+    num_images = len(image_urls)
     total_duration = num_images * interval_per_image
     OVERLAY_OPACITY = "rgba(0,0,0,0.6)"
 
@@ -63,13 +199,13 @@ def set_cinematic_bg(base64_urls, interval_per_image=6):
         """, unsafe_allow_html=True)
         return
 
-    css_keyframes = []
-    for i in range(num_images):
-        start_percent = (i * 100) / num_images
-        hold_percent = start_percent + (100 / num_images)
-        css_keyframes.append(f"{start_percent:.2f}% {{ background-image: url('{base64_urls[i]}'); }}")
-        css_keyframes.append(f"{hold_percent:.2f}% {{ background-image: url('{base64_urls[i]}'); }}")
-    css_keyframes.append(f"100% {{ background-image: url('{base64_urls[0]}'); }}")
+    # One grouped rule per image so each URL appears only once in the keyframes
+    urls_fmt = [f"url('{u}')" for u in image_urls]
+    css_keyframes = [
+        f"{(i * 100) / num_images:.2f}%, {((i + 1) * 100) / num_images:.2f}% {{ background-image: {urls_fmt[i]}; }}"
+        for i in range(num_images)
+    ]
+    css_keyframes.append(f"100% {{ background-image: {urls_fmt[0]}; }}")
 
     st.markdown(f"""
         <style>
@@ -77,7 +213,7 @@ def set_cinematic_bg(base64_urls, interval_per_image=6):
             background-size: cover;
             background-attachment: fixed;
             background-repeat: no-repeat;
-            background-image: url('{base64_urls[0]}');
+            background-image: {urls_fmt[0]};
             animation: cinematicBg {total_duration}s infinite;
             color: white;
         }}
@@ -107,18 +243,72 @@ def set_cinematic_bg(base64_urls, interval_per_image=6):
 # ================================
 # 🧠 LOAD MODEL
 # ================================
+@st.cache_resource(show_spinner=False)
+def load_artifacts():
+    """Loads the model and vectorizer once per process."""
+    svm = joblib.load(MODEL_PATH, mmap_mode="r")
+    tfidf = joblib.load(VECTORIZER_PATH, mmap_mode="r")
+    # Linear models predict with a plain dot product, so keep float32 weights at hand
+    linear_weights = None
+    if isinstance(svm, LinearSVC):
+        svm.coef_ = svm.coef_.astype(np.float32)
+        svm.intercept_ = svm.intercept_.astype(np.float32)
+        linear_weights = (svm.coef_, svm.intercept_)
+
+    # Plain L2-normalized TF-IDF can be rebuilt per token without a CSR matrix
+    sparse_features = None
+    if (isinstance(tfidf, TfidfVectorizer) and tfidf.use_idf and tfidf.norm == "l2"
+            and not tfidf.binary and not tfidf.sublinear_tf):
+        sparse_features = (tfidf.build_analyzer(), tfidf.vocabulary_, tfidf.idf_.astype(np.float32))
+    return svm, tfidf, linear_weights, sparse_features
+
+def vectorize_sparse(text, sparse_features):
+    """Returns the nonzero TF-IDF indices and values of text, like a CSR row."""
+    analyzer, vocabulary, idf = sparse_features
+    counts = Counter(idx for idx in map(vocabulary.get, analyzer(text)) if idx is not None)
+    indices = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+    data = np.fromiter(counts.values(), dtype=np.float32, count=len(counts)) * idf[indices]
+    if len(data):
+        data /= np.linalg.norm(data)
+    return indices, data
+
+def predict_sentiment(text, svm, tfidf, linear_weights, sparse_features):
+    """Predicts the class label of cleaned feedback text."""
+    if linear_weights is None:
+        vectorized_text = tfidf.transform([text])
+        if vectorized_text.nnz == 0:
+            st.warning(OOV_WARNING)
+        return svm.predict(vectorized_text)[0]
+
+    if sparse_features is not None:
+        indices, data = vectorize_sparse(text, sparse_features)
+    else:
+        vectorized_text = tfidf.transform([text])
+        indices, data = vectorized_text.indices, vectorized_text.data
+
+    W, b = linear_weights
+    if len(indices) == 0:
+        # No known terms: the decision function reduces to the intercept
+        st.warning(OOV_WARNING)
+        scores = b
+    else:
+        # Only the nonzero TF-IDF entries contribute to the decision function
+        scores = W[:, indices] @ data + b
+    if scores.shape[0] == 1:
+        return svm.classes_[int(scores[0] > 0)]
+    return svm.classes_[int(np.argmax(scores))]
+
 try:
-    svm = joblib.load(MODEL_PATH)
-    tfidf = joblib.load(VECTORIZER_PATH)
+    svm, tfidf, linear_weights, sparse_features = load_artifacts()
     st.info("✅ Model and Vectorizer loaded successfully!")
 except Exception as e:
     st.error(f"❌ Failed to load model/vectorizer: {e}")
-    svm, tfidf = None, None
+    svm, tfidf, linear_weights, sparse_features = None, None, None, None
 
 # ================================
 # 📂 SIDEBAR
 # ================================
-base64_image_urls = []
+bg_image_urls = []
 with st.sidebar:
     st.title("⚙️ App Configuration")
     uploaded_files = st.file_uploader(
@@ -129,11 +319,13 @@ with st.sidebar:
     )
     if uploaded_files:
         with st.spinner("Processing images..."):
-            for file in uploaded_files:
-                url = get_base64_image_url(file)
-                if url:
-                    base64_image_urls.append(url)
-            time.sleep(0.5)
+            # Worker threads need the script context to use st.cache_data / st.error
+            with ThreadPoolExecutor(
+                max_workers=os.cpu_count(),
+                initializer=add_script_run_ctx,
+                initargs=(None, get_script_run_ctx()),
+            ) as executor:
+                bg_image_urls = [url for url in executor.map(get_image_url, uploaded_files) if url]
         st.success("✅ Images processed successfully!")
 
     st.markdown("---")
@@ -143,16 +335,16 @@ with st.sidebar:
     st.markdown("Made with ❤️ ", unsafe_allow_html=True)
     st.markdown("✨ Developed by **Umar Imam**", unsafe_allow_html=True)
 
-set_cinematic_bg(base64_image_urls)
+set_cinematic_bg(bg_image_urls)
 
 # ================================
 # 🍽️ HEADER
 # ================================
-st.set_page_config(layout="centered")
 st.markdown("""
 <h1 style='text-align:center; color:#ff7b00; text-shadow: 2px 2px 6px #000;'>🍽️ Restaurant Customer Feedback Analyzer</h1>
 <p style='text-align:center; font-size:18px; color:#fff;'>Understand how your customers feel through AI-driven sentiment analysis.</p>
 """, unsafe_allow_html=True)
+st.markdown(RESULT_CARD_CSS, unsafe_allow_html=True)
 
 # ================================
 # 📊 TABS
@@ -172,70 +364,28 @@ with tab1:
             st.warning("⚠️ Please enter some feedback text.")
         else:
             with st.spinner("Analyzing sentiment..."):
-                # ✅ Step 1: Force model reload for each run
-                svm = joblib.load(MODEL_PATH)
-                tfidf = joblib.load(VECTORIZER_PATH)
+                # ✅ Step 1: Reuse the cached model and vectorizer
+                svm, tfidf, linear_weights, sparse_features = load_artifacts()
 
                 # ✅ Step 2: Clean the text before vectorizing
                 cleaned = clean_text(feedback_text)
-                vectorized_text = tfidf.transform([cleaned])
 
                 # Predict
-                prediction_num = svm.predict(vectorized_text)[0]
-
-                # Convert to normal int if np.int64
-                if isinstance(prediction_num, np.generic):
-                    prediction_num = prediction_num.item()
+                prediction_num = predict_sentiment(cleaned, svm, tfidf, linear_weights, sparse_features)
 
                 # Auto-detect if model has 2 or 3 classes
                 model_classes = getattr(svm, "classes_", [0, 1])
-                if len(model_classes) == 3:
-                    label_map = {0: "Negative", 1: "Neutral", 2: "Positive"}
-                else:
-                    label_map = {0: "Negative", 1: "Positive"}
-
-                prediction = label_map.get(int(prediction_num), "Unknown").lower()
-                prediction_str = str(prediction).lower()
+                labels = LABELS_BY_CLASS_COUNT[3 if len(model_classes) == 3 else 2]
+                prediction_num = int(prediction_num)
+                prediction_str = labels[prediction_num] if 0 <= prediction_num < len(labels) else "unknown"
 
                 st.balloons()
 
-                color_map = {
-                    "positive": "#00C851",
-                    "negative": "#ff4444",
-                    "neutral": "#33b5e5"
-                }
-
-                witty_lines = {
-                    "positive": [
-                        "Keep delighting your customers! 🌟",
-                        "Your customers are loving it — keep the momentum! 💖",
-                        "Fantastic feedback — your efforts are paying off! 🎉"
-                    ],
-                    "negative": [
-                        "Time to spice things up a bit! 🌶️",
-                        "Some customers are unhappy — let’s fix that 💪",
-                        "Don't worry, feedback is the first step to improvement! 🚀"
-                    ],
-                    "neutral": [
-                        "Mixed feelings — maybe consistency is key 🔄",
-                        "Neither hot nor cold — you can warm things up! ☕",
-                        "Good, but there’s room to impress even more ✨"
-                    ]
-                }
-
-                st.markdown(f"""
-                    <div style="background-color:{color_map.get(prediction_str, '#444')};
-                                padding:25px; border-radius:15px;
-                                text-align:center;
-                                box-shadow:0 0 20px {color_map.get(prediction_str, '#444')};">
-                        <h2 style="color:white;">Predicted Sentiment</h2>
-                        <h1 style="color:white; font-size:3.5em;">{prediction_str.capitalize()}</h1>
-                    </div>
-                """, unsafe_allow_html=True)
-
-                message = random.choice(
-                    witty_lines.get(prediction_str, ["Keep striving to make every customer smile! 😄"])
-                )
+                with st.container(border=True, key=f"result_{prediction_str}"):
+                    st.subheader("Predicted Sentiment")
+                    st.metric(label="Predicted Sentiment", value=prediction_str.capitalize(), label_visibility="collapsed")
+
+                message = random.choice(WITTY_LINES.get(prediction_str, DEFAULT_WITTY_LINES))
                 st.info(message)
 
 